@@ -4,18 +4,27 @@ FastAPI server for receiving voice recordings and session data
 """
 
 import os
+import asyncio
 import json
 import uuid
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from collections import Counter, defaultdict
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Tuple
 from pathlib import Path
 
 from fastapi import FastAPI, File, UploadFile, Form, HTTPException, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
+from fastapi.responses import ORJSONResponse, FileResponse, StreamingResponse
 from pydantic import BaseModel
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.config import Config
+import aiofiles
+import orjson
 import tarfile
 import io
 
@@ -65,6 +74,53 @@ if STORAGE_TYPE == "r2" and R2_ENDPOINT:
         config=Config(signature_version="s3v4"),
     )
 
+# Multipart settings for R2 audio uploads; objects above the threshold are
+# split into parts and sent concurrently over the client's connection pool
+R2_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=8,
+    use_threads=True,
+)
+
+# Metadata index
+# The JSON files on disk remain the source of truth; metadata.db mirrors them
+# so stats and export are answered by queries instead of a walk over files
+METADATA_DB_PATH = LOCAL_STORAGE_PATH / "metadata.db"
+METADATA_DB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    playerId TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS recordings (
+    key TEXT PRIMARY KEY,
+    sessionId TEXT NOT NULL,
+    phraseCategory TEXT NOT NULL,
+    phraseRegister TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_recordings_session ON recordings (sessionId);
+"""
+METADATA_DB_VERSION = 1
+EXPORT_BATCH_SIZE = 500
+EXPORT_CACHE_PATH = LOCAL_STORAGE_PATH / "export.cache"
+EXPORT_CACHE_TMP_PATH = LOCAL_STORAGE_PATH / "export.cache.tmp"
+EXPORT_CHUNK_SIZE = 256 * 1024
+
+# Derived files in LOCAL_STORAGE_PATH that are rebuilt from the data and left out of archives
+ARCHIVE_EXCLUDE = {
+    METADATA_DB_PATH.name,
+    f"{METADATA_DB_PATH.name}-journal",
+    EXPORT_CACHE_PATH.name,
+    EXPORT_CACHE_TMP_PATH.name,
+}
+BACKFILL_WORKERS = 16
+
+# Upload limits
+MAX_AUDIO_BYTES = 5 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
 
 # Models
 class SessionData(BaseModel):
@@ -106,6 +162,10 @@ class RecordingMetadata(BaseModel):
     timestampUtc: str
 
 
+class StoredRecordingMetadata(RecordingMetadata):
+    audioPath: str
+
+
 class UploadResponse(BaseModel):
     success: bool
     sessionId: str
@@ -121,56 +181,393 @@ class StatsResponse(BaseModel):
     registerBreakdown: dict
 
 
+# Metadata index helpers
+def connect_metadata_db() -> sqlite3.Connection:
+    """Open a connection to the metadata index"""
+    return sqlite3.connect(METADATA_DB_PATH, check_same_thread=False)
+
+
+def insert_session(conn: sqlite3.Connection, session_id: str, player_id: str, content: str):
+    """Insert or update a session row (an update keeps its rowid and export position)"""
+    conn.execute(
+        "INSERT INTO sessions (id, playerId, data) VALUES (?, ?, ?) "
+        "ON CONFLICT (id) DO UPDATE SET playerId = excluded.playerId, data = excluded.data",
+        (session_id, player_id, content),
+    )
+
+
+def insert_recording(
+    conn: sqlite3.Connection, key: str, session_id: str, category: str, register: str, content: str
+):
+    """Insert or update a recording row (an update keeps its rowid and export position)"""
+    conn.execute(
+        "INSERT INTO recordings (key, sessionId, phraseCategory, phraseRegister, data) "
+        "VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT (key) DO UPDATE SET sessionId = excluded.sessionId, "
+        "phraseCategory = excluded.phraseCategory, phraseRegister = excluded.phraseRegister, "
+        "data = excluded.data",
+        (key, session_id, category, register, content),
+    )
+
+
+# Write generation of the metadata index, bumped after every committed save.
+# The app runs as a single uvicorn worker, so this process sees every write
+metadata_generation = 0
+metadata_generation_lock = threading.Lock()
+
+
+def bump_metadata_generation():
+    """Mark the metadata index as changed (called from worker threads)"""
+    global metadata_generation
+    with metadata_generation_lock:
+        metadata_generation += 1
+
+
+def index_session(session_id: str, player_id: str, content: str):
+    """Add a saved session to the metadata index"""
+    with closing(connect_metadata_db()) as conn, conn:
+        insert_session(conn, session_id, player_id, content)
+    bump_metadata_generation()
+
+
+def index_recording(key: str, session_id: str, category: str, register: str, content: str) -> bool:
+    """Add a saved recording to the metadata index, returning True if it was not indexed before"""
+    # A single statement, so two racing inserts cannot both see the key as new
+    with closing(connect_metadata_db()) as conn, conn:
+        cursor = conn.execute(
+            "INSERT INTO recordings (key, sessionId, phraseCategory, phraseRegister, data) "
+            "VALUES (?, ?, ?, ?, ?) ON CONFLICT (key) DO NOTHING",
+            (key, session_id, category, register, content),
+        )
+    is_new = cursor.rowcount == 1
+    if is_new:
+        bump_metadata_generation()
+    return is_new
+
+
+def recording_is_indexed(key: str) -> bool:
+    """Check whether a recording is already in the metadata index"""
+    with closing(connect_metadata_db()) as conn:
+        return conn.execute("SELECT 1 FROM recordings WHERE key = ?", (key,)).fetchone() is not None
+
+
+def recording_key(session_id: str, phrase_id: str, timestamp_utc: str) -> str:
+    """Unique index key for a recording (matches the legacy per-recording file name)"""
+    return f"{session_id}/{phrase_id}_{timestamp_utc.replace(':', '-')}.json"
+
+
+def read_json_file(path: str) -> Optional[dict]:
+    """Read and parse a JSON file, returning None if it cannot be parsed"""
+    try:
+        with open(path, "rb") as f:
+            return orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError) as e:
+        print(f"Skipping unreadable file {path}: {e}")
+        return None
+
+
+def read_jsonl_file(path: str) -> List[dict]:
+    """Read and parse a JSON Lines file, skipping lines that cannot be parsed"""
+    records = []
+    try:
+        with open(path, "rb") as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    records.append(orjson.loads(line))
+                except orjson.JSONDecodeError as e:
+                    print(f"Skipping unreadable line {line_number} of {path}: {e}")
+    except OSError as e:
+        print(f"Skipping unreadable file {path}: {e}")
+    return records
+
+
+def backfill_metadata_db(conn: sqlite3.Connection):
+    """Index every session and metadata file already on disk"""
+    # os.scandir reuses the dirent type, avoiding a stat and a Path per entry
+    sessions_dir = os.path.join(LOCAL_STORAGE_PATH, "sessions")
+    metadata_dir = os.path.join(LOCAL_STORAGE_PATH, "metadata")
+
+    session_files = []  # (session id, path)
+    meta_files = []  # (index key, path) for legacy per-recording files
+    meta_logs = []  # path of each per-session JSONL log
+
+    if os.path.isdir(sessions_dir):
+        with os.scandir(sessions_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(".json"):
+                    session_files.append((entry.name[:-5], entry.path))
+
+    if os.path.isdir(metadata_dir):
+        with os.scandir(metadata_dir) as session_entries:
+            for session_entry in session_entries:
+                if session_entry.name.endswith(".jsonl"):
+                    meta_logs.append(session_entry.path)
+                    continue
+                if not session_entry.is_dir(follow_symlinks=False):
+                    continue
+                with os.scandir(session_entry.path) as meta_entries:
+                    for meta_entry in meta_entries:
+                        if meta_entry.name.endswith(".json"):
+                            meta_files.append((f"{session_entry.name}/{meta_entry.name}", meta_entry.path))
+
+    # Read and parse on a thread pool so disk waits overlap; rows are inserted
+    # from this thread since the connection is not shared
+    with ThreadPoolExecutor(max_workers=BACKFILL_WORKERS) as executor:
+        sessions = executor.map(read_json_file, [path for _, path in session_files])
+        for (session_id, _), session in zip(session_files, sessions):
+            if session is None:
+                continue
+            insert_session(conn, session_id, session.get("playerId", "unknown"), orjson.dumps(session).decode())
+
+        def index_meta(key: str, meta: dict):
+            insert_recording(
+                conn,
+                key,
+                meta.get("sessionId", "unknown"),
+                meta.get("phraseCategory", "unknown"),
+                meta.get("phraseRegister", "unknown"),
+                orjson.dumps(meta).decode(),
+            )
+
+        metas = executor.map(read_json_file, [path for _, path in meta_files])
+        for (key, _), meta in zip(meta_files, metas):
+            if meta is not None:
+                index_meta(key, meta)
+
+        # Later lines for the same recording replace earlier ones
+        for log in executor.map(read_jsonl_file, meta_logs):
+            for meta in log:
+                key = recording_key(
+                    meta.get("sessionId", "unknown"), meta.get("phraseId", ""), meta.get("timestampUtc", "")
+                )
+                index_meta(key, meta)
+
+
+def init_metadata_db():
+    """Create the metadata index, backfilling it from existing files if not done yet"""
+    with closing(connect_metadata_db()) as conn:
+        conn.executescript(METADATA_DB_SCHEMA)
+
+        # user_version marks a completed backfill; it is set in the same
+        # transaction as the inserts, so an interrupted backfill is retried
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= METADATA_DB_VERSION:
+            return
+
+        with conn:
+            conn.execute("BEGIN")
+            backfill_metadata_db(conn)
+            conn.execute(f"PRAGMA user_version = {METADATA_DB_VERSION}")
+
+
+# Stats aggregation
+class StatsAggregator:
+    """
+    In-memory collection statistics.
+
+    Populated from the metadata index at startup, then kept up to date by
+    the save helpers so /api/stats never has to touch the disk.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Clear all counters"""
+        self.session_players = {}  # session id -> player id
+        self.player_sessions = Counter()  # player id -> number of sessions
+        self.total_recordings = 0
+        self.phrase_breakdown = Counter()
+        self.register_breakdown = Counter()
+
+    def rebuild(self):
+        """Reload all counters from the metadata index"""
+        self.reset()
+
+        with closing(connect_metadata_db()) as conn:
+            self.session_players = dict(conn.execute("SELECT id, playerId FROM sessions"))
+            self.player_sessions = Counter(self.session_players.values())
+            self.total_recordings = conn.execute("SELECT COUNT(*) FROM recordings").fetchone()[0]
+            self.phrase_breakdown = Counter(dict(conn.execute(
+                "SELECT phraseCategory, COUNT(*) FROM recordings GROUP BY phraseCategory"
+            )))
+            self.register_breakdown = Counter(dict(conn.execute(
+                "SELECT phraseRegister, COUNT(*) FROM recordings GROUP BY phraseRegister"
+            )))
+
+    def add_session(self, session_id: str, player_id: str):
+        """Record a saved session (re-saving the same session is a no-op)"""
+        if session_id in self.session_players:
+            previous = self.session_players[session_id]
+            if previous == player_id:
+                return
+            self.player_sessions[previous] -= 1
+            if not self.player_sessions[previous]:
+                del self.player_sessions[previous]
+
+        self.session_players[session_id] = player_id
+        self.player_sessions[player_id] += 1
+
+    def add_recording(self, category: str, register: str):
+        """Record a newly saved recording"""
+        self.total_recordings += 1
+        self.phrase_breakdown[category] += 1
+        self.register_breakdown[register] += 1
+
+    def snapshot(self) -> dict:
+        """Current stats in StatsResponse shape"""
+        return {
+            "totalSessions": len(self.session_players),
+            "totalRecordings": self.total_recordings,
+            "totalPlayersUnique": len(self.player_sessions),
+            "phraseBreakdown": dict(self.phrase_breakdown),
+            "registerBreakdown": dict(self.register_breakdown),
+        }
+
+
+stats_aggregator = StatsAggregator()
+
+
+@app.on_event("startup")
+async def load_stats():
+    """Prepare the metadata index and populate the stats aggregator from it"""
+    await asyncio.to_thread(init_metadata_db)
+    await asyncio.to_thread(stats_aggregator.rebuild)
+
+
 # Helper functions
-def save_audio_local(session_id: str, phrase_id: str, audio_data: bytes, filename: str) -> str:
+async def save_audio_local(session_id: str, phrase_id: str, audio_data: bytes, filename: str) -> str:
     """Save audio file to local storage"""
     audio_dir = LOCAL_STORAGE_PATH / "audio" / session_id
     audio_dir.mkdir(parents=True, exist_ok=True)
     
     file_path = audio_dir / filename
-    with open(file_path, "wb") as f:
-        f.write(audio_data)
+    async with aiofiles.open(file_path, "wb") as f:
+        await f.write(audio_data)
     
     return str(file_path)
 
 
-def save_audio_r2(session_id: str, phrase_id: str, audio_data: bytes, filename: str) -> str:
+async def save_audio_r2(session_id: str, phrase_id: str, audio_data: bytes, filename: str) -> str:
     """Save audio file to Cloudflare R2"""
     key = f"audio/{session_id}/{filename}"
     
-    s3_client.put_object(
-        Bucket=R2_BUCKET,
-        Key=key,
-        Body=audio_data,
-        ContentType="audio/webm"
+    # boto3 is blocking; run it in a worker thread to keep the event loop free
+    await asyncio.to_thread(
+        s3_client.upload_fileobj,
+        io.BytesIO(audio_data),
+        R2_BUCKET,
+        key,
+        ExtraArgs={"ContentType": "audio/webm"},
+        Config=R2_TRANSFER_CONFIG,
     )
     
     return f"r2://{R2_BUCKET}/{key}"
 
 
-def save_session_local(session: SessionData) -> str:
+async def save_upload_local(session_id: str, phrase_id: str, upload: UploadFile, filename: str) -> Tuple[str, int]:
+    """Stream an uploaded audio file to local storage, enforcing the size limit"""
+    audio_dir = LOCAL_STORAGE_PATH / "audio" / session_id
+    audio_dir.mkdir(parents=True, exist_ok=True)
+    
+    file_path = audio_dir / filename
+    total = 0
+    async with aiofiles.open(file_path, "wb") as f:
+        while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+            total += len(chunk)
+            if total > MAX_AUDIO_BYTES:
+                break
+            await f.write(chunk)
+    
+    if total > MAX_AUDIO_BYTES:
+        file_path.unlink(missing_ok=True)
+        raise HTTPException(status_code=400, detail="Audio file too large (max 5MB)")
+    
+    return str(file_path), total
+
+
+async def save_upload_r2(session_id: str, phrase_id: str, upload: UploadFile, filename: str) -> Tuple[str, int]:
+    """Stream an uploaded audio file to Cloudflare R2, enforcing the size limit"""
+    # The upload is already spooled by Starlette, so its size is a seek away
+    upload.file.seek(0, os.SEEK_END)
+    total = upload.file.tell()
+    upload.file.seek(0)
+    
+    if total > MAX_AUDIO_BYTES:
+        raise HTTPException(status_code=400, detail="Audio file too large (max 5MB)")
+    
+    key = f"audio/{session_id}/{filename}"
+    
+    await asyncio.to_thread(
+        s3_client.upload_fileobj,
+        upload.file,
+        R2_BUCKET,
+        key,
+        ExtraArgs={"ContentType": "audio/webm"},
+        Config=R2_TRANSFER_CONFIG,
+    )
+    
+    return f"r2://{R2_BUCKET}/{key}", total
+
+
+# Audio storage backend, fixed at startup (s3_client is only set for "r2")
+save_audio = save_audio_r2 if s3_client else save_audio_local
+save_upload = save_upload_r2 if s3_client else save_upload_local
+
+
+async def save_session_local(session: SessionData) -> str:
     """Save session data to local storage"""
     session_dir = LOCAL_STORAGE_PATH / "sessions"
     file_path = session_dir / f"{session.id}.json"
     
-    with open(file_path, "w") as f:
-        json.dump(session.dict(), f, indent=2)
+    # Compact JSON: these files are only read by machines
+    content = session.model_dump_json()
+    
+    async with aiofiles.open(file_path, "w") as f:
+        await f.write(content)
+    
+    await asyncio.to_thread(index_session, session.id, session.playerId, content)
+    stats_aggregator.add_session(session.id, session.playerId)
     
     return str(file_path)
 
 
-def save_recording_metadata_local(metadata: RecordingMetadata, audio_path: str) -> str:
-    """Save recording metadata to local storage"""
-    metadata_dir = LOCAL_STORAGE_PATH / "metadata" / metadata.sessionId
+# Per-session locks that make the duplicate check, append and index one step
+recording_locks = defaultdict(asyncio.Lock)
+
+
+async def save_recording_metadata_local(metadata: RecordingMetadata, audio_path: str) -> str:
+    """Append recording metadata to its session's JSONL log in local storage"""
+    metadata_dir = LOCAL_STORAGE_PATH / "metadata"
     metadata_dir.mkdir(parents=True, exist_ok=True)
     
-    file_path = metadata_dir / f"{metadata.phraseId}_{metadata.timestampUtc.replace(':', '-')}.json"
-    
-    data = metadata.dict()
-    data["audioPath"] = audio_path
+    file_path = metadata_dir / f"{metadata.sessionId}.jsonl"
     
-    with open(file_path, "w") as f:
-        json.dump(data, f, indent=2)
+    # Offline sync retries resend recordings, often concurrently; keep only
+    # the first copy so the append-only log does not collect duplicate lines
+    key = recording_key(metadata.sessionId, metadata.phraseId, metadata.timestampUtc)
+    async with recording_locks[metadata.sessionId]:
+        if await asyncio.to_thread(recording_is_indexed, key):
+            return str(file_path)
+        
+        stored = StoredRecordingMetadata(**dict(metadata), audioPath=audio_path)
+        content = stored.model_dump_json()
+        
+        # A single O_APPEND write per line, so concurrent appends do not interleave
+        async with aiofiles.open(file_path, "a") as f:
+            await f.write(content + "\n")
+        
+        is_new = await asyncio.to_thread(
+            index_recording,
+            key,
+            metadata.sessionId,
+            metadata.phraseCategory,
+            metadata.phraseRegister,
+            content,
+        )
+    if is_new:
+        stats_aggregator.add_recording(metadata.phraseCategory, metadata.phraseRegister)
     
     return str(file_path)
 
@@ -183,20 +580,17 @@ async def process_upload_background(
     try:
         # Save session
         session = SessionData(**session_data)
-        save_session_local(session)
+        await save_session_local(session)
         
         # Save recordings
         for metadata_dict, audio_bytes, filename in recordings:
             metadata = RecordingMetadata(**metadata_dict)
             
             # Save audio
-            if STORAGE_TYPE == "r2" and s3_client:
-                audio_path = save_audio_r2(session.id, metadata.phraseId, audio_bytes, filename)
-            else:
-                audio_path = save_audio_local(session.id, metadata.phraseId, audio_bytes, filename)
+            audio_path = await save_audio(session.id, metadata.phraseId, audio_bytes, filename)
             
             # Save metadata
-            save_recording_metadata_local(metadata, audio_path)
+            await save_recording_metadata_local(metadata, audio_path)
         
         print(f"Processed session {session.id} with {len(recordings)} recordings")
         
@@ -204,6 +598,110 @@ async def process_upload_background(
         print(f"Error processing upload: {e}")
 
 
+def fetch_json_batch(query: str, after_rowid: int) -> List[tuple]:
+    """Fetch one batch of (rowid, data) rows with rowid above after_rowid"""
+    # fetchall drains the statement, so no read lock is held between batches
+    with closing(connect_metadata_db()) as conn:
+        return conn.execute(query, (after_rowid, EXPORT_BATCH_SIZE)).fetchall()
+
+
+async def stream_json_rows(query: str):
+    """Yield the JSON `data` column of a keyset-paginated query as comma-separated batches"""
+    after_rowid = 0
+    first = True
+    while rows := await asyncio.to_thread(fetch_json_batch, query, after_rowid):
+        after_rowid = rows[-1][0]
+        chunk = ",".join(row[1] for row in rows).encode()
+        yield chunk if first else b"," + chunk
+        first = False
+
+
+async def stream_export_body():
+    """
+    Stream the export document from the metadata index, without its
+    opening brace and exportedAt member (added when the export is served).
+
+    Rows are read in short, separate batches so uploads are never blocked
+    for the length of a download, and their stored JSON is passed through
+    verbatim instead of being parsed and re-serialized.
+    """
+    yield b'"sessions":['
+
+    async for chunk in stream_json_rows(
+        "SELECT rowid, data FROM sessions WHERE rowid > ? ORDER BY rowid LIMIT ?"
+    ):
+        yield chunk
+
+    yield b'],"recordings":['
+
+    async for chunk in stream_json_rows(
+        "SELECT rowid, data FROM recordings WHERE rowid > ? ORDER BY rowid LIMIT ?"
+    ):
+        yield chunk
+
+    yield b"]}"
+
+
+# Export cache
+# The serialized export body is kept on disk and served from there until
+# the metadata index changes. Within a run that is tracked exactly by the
+# write generation; the index mtime only vouches for a cache left behind by
+# a previous run
+export_cache_lock = asyncio.Lock()
+export_cache_generation: Optional[int] = None  # generation of the last build in this run
+
+
+def export_cache_is_fresh() -> bool:
+    """Check whether the cached export reflects the current metadata index"""
+    if export_cache_generation is not None:
+        return export_cache_generation == metadata_generation
+    if metadata_generation:
+        return False
+    try:
+        cache_mtime = os.stat(EXPORT_CACHE_PATH).st_mtime_ns
+        index_mtime = os.stat(METADATA_DB_PATH).st_mtime_ns
+    except FileNotFoundError:
+        return False
+    return cache_mtime >= index_mtime
+
+
+async def build_export_cache():
+    """Write the export to a temporary file and atomically move it into place"""
+    global export_cache_generation
+
+    # Record the generation and index mtime from before the build, so a
+    # save that lands mid-build still invalidates it, now and after a restart
+    generation = metadata_generation
+    index_mtime = os.stat(METADATA_DB_PATH).st_mtime_ns
+
+    async with aiofiles.open(EXPORT_CACHE_TMP_PATH, "wb") as f:
+        async for chunk in stream_export_body():
+            await f.write(chunk)
+
+    os.utime(EXPORT_CACHE_TMP_PATH, ns=(index_mtime, index_mtime))
+    os.replace(EXPORT_CACHE_TMP_PATH, EXPORT_CACHE_PATH)
+    export_cache_generation = generation
+
+
+async def stream_export_cache():
+    """Stream the cached export, stamped with the time of this request"""
+    exported_at = orjson.dumps(datetime.utcnow().isoformat())
+    yield b'{"exportedAt":' + exported_at + b","
+
+    # A rebuild replaces the cache atomically, so the open file stays consistent
+    async with aiofiles.open(EXPORT_CACHE_PATH, "rb") as f:
+        while chunk := await f.read(EXPORT_CHUNK_SIZE):
+            yield chunk
+
+
+def exclude_derived_files(tarinfo: tarfile.TarInfo) -> Optional[tarfile.TarInfo]:
+    """tar.add filter that drops the index and export cache from archives"""
+    _, _, name = tarinfo.name.partition("/")
+    if "/" not in name and name in ARCHIVE_EXCLUDE:
+        return None
+    return tarinfo
+
+
 # Routes
 @app.get("/")
 async def root():
@@ -241,7 +739,7 @@ async def upload_session(
 
         # Save session data
         session_obj = SessionData(**session_data)
-        save_session_local(session_obj)
+        await save_session_local(session_obj)
 
         # Parse the form data to get audio files
         form = await request.form()
@@ -263,13 +761,10 @@ async def upload_session(
 
                 # Save audio file
                 filename = f"{metadata.phraseId}.webm"
-                if STORAGE_TYPE == "r2" and s3_client:
-                    audio_path = save_audio_r2(session_id, metadata.phraseId, audio_data, filename)
-                else:
-                    audio_path = save_audio_local(session_id, metadata.phraseId, audio_data, filename)
+                audio_path = await save_audio(session_id, metadata.phraseId, audio_data, filename)
 
                 # Save recording metadata
-                save_recording_metadata_local(metadata, audio_path)
+                await save_recording_metadata_local(metadata, audio_path)
                 recordings_count += 1
 
             idx += 1
@@ -300,81 +795,39 @@ async def upload_audio(
     """Upload a single audio recording"""
     try:
         metadata_dict = json.loads(metadata)
-        audio_bytes = await audio.read()
-        
-        # Validate audio size (max 5MB)
-        if len(audio_bytes) > 5 * 1024 * 1024:
-            raise HTTPException(status_code=400, detail="Audio file too large (max 5MB)")
         
         # Generate filename
         timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
         filename = f"{phrase_id}_{timestamp}.webm"
         
-        # Save audio
-        if STORAGE_TYPE == "r2" and s3_client:
-            audio_path = save_audio_r2(session_id, phrase_id, audio_bytes, filename)
-        else:
-            audio_path = save_audio_local(session_id, phrase_id, audio_bytes, filename)
+        # Stream audio to storage in chunks (max 5MB)
+        audio_path, size_bytes = await save_upload(session_id, phrase_id, audio, filename)
         
         # Save metadata
         metadata_obj = RecordingMetadata(**metadata_dict)
-        save_recording_metadata_local(metadata_obj, audio_path)
+        await save_recording_metadata_local(metadata_obj, audio_path)
         
         return {
             "success": True,
             "audioPath": audio_path,
-            "sizeBytes": len(audio_bytes)
+            "sizeBytes": size_bytes
         }
         
+    except HTTPException:
+        raise
     except json.JSONDecodeError as e:
         raise HTTPException(status_code=400, detail=f"Invalid metadata JSON: {e}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Upload failed: {e}")
 
 
-@app.get("/api/stats", response_model=StatsResponse)
+@app.get("/api/stats", response_model=StatsResponse, response_class=ORJSONResponse)
 async def get_stats():
     """Get aggregate statistics about collected data"""
     try:
-        sessions_dir = LOCAL_STORAGE_PATH / "sessions"
-        metadata_dir = LOCAL_STORAGE_PATH / "metadata"
-        
-        # Count sessions
-        session_files = list(sessions_dir.glob("*.json")) if sessions_dir.exists() else []
-        total_sessions = len(session_files)
-        
-        # Count unique players and gather stats
-        unique_players = set()
-        phrase_breakdown = {}
-        register_breakdown = {}
-        total_recordings = 0
-        
-        for session_file in session_files:
-            with open(session_file) as f:
-                session = json.load(f)
-                unique_players.add(session.get("playerId", "unknown"))
-        
-        # Count recordings and gather phrase/register stats
-        if metadata_dir.exists():
-            for session_dir in metadata_dir.iterdir():
-                if session_dir.is_dir():
-                    for meta_file in session_dir.glob("*.json"):
-                        total_recordings += 1
-                        with open(meta_file) as f:
-                            meta = json.load(f)
-                            category = meta.get("phraseCategory", "unknown")
-                            register = meta.get("phraseRegister", "unknown")
-                            
-                            phrase_breakdown[category] = phrase_breakdown.get(category, 0) + 1
-                            register_breakdown[register] = register_breakdown.get(register, 0) + 1
-        
-        return StatsResponse(
-            totalSessions=total_sessions,
-            totalRecordings=total_recordings,
-            totalPlayersUnique=len(unique_players),
-            phraseBreakdown=phrase_breakdown,
-            registerBreakdown=register_breakdown
-        )
+        # Return the response directly so FastAPI skips jsonable_encoder;
+        # response_model is kept for the OpenAPI schema only
+        return ORJSONResponse(stats_aggregator.snapshot())
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get stats: {e}")
@@ -384,30 +837,12 @@ async def get_stats():
 async def export_data(format: str = "json"):
     """Export collected data for analysis"""
     try:
-        sessions_dir = LOCAL_STORAGE_PATH / "sessions"
-        metadata_dir = LOCAL_STORAGE_PATH / "metadata"
-
-        export_data = {
-            "exportedAt": datetime.utcnow().isoformat(),
-            "sessions": [],
-            "recordings": []
-        }
-
-        # Export sessions
-        if sessions_dir.exists():
-            for session_file in sessions_dir.glob("*.json"):
-                with open(session_file) as f:
-                    export_data["sessions"].append(json.load(f))
-
-        # Export recording metadata
-        if metadata_dir.exists():
-            for session_dir in metadata_dir.iterdir():
-                if session_dir.is_dir():
-                    for meta_file in session_dir.glob("*.json"):
-                        with open(meta_file) as f:
-                            export_data["recordings"].append(json.load(f))
+        if not export_cache_is_fresh():
+            async with export_cache_lock:
+                if not export_cache_is_fresh():
+                    await build_export_cache()
 
-        return JSONResponse(content=export_data)
+        return StreamingResponse(stream_export_cache(), media_type="application/json")
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Export failed: {e}")
@@ -449,7 +884,7 @@ async def download_archive():
         with tarfile.open(fileobj=tar_buffer, mode='w:gz') as tar:
             # Add all data directories
             if LOCAL_STORAGE_PATH.exists():
-                tar.add(LOCAL_STORAGE_PATH, arcname='voice-runner-data')
+                tar.add(LOCAL_STORAGE_PATH, arcname='voice-runner-data', filter=exclude_derived_files)
 
         tar_buffer.seek(0)
 
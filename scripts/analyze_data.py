@@ -10,18 +10,57 @@ from datetime import datetime
 from collections import Counter
 
 try:
-    import pandas as pd
     import matplotlib.pyplot as plt
-    PANDAS_AVAILABLE = True
+    MATPLOTLIB_AVAILABLE = True
+except ImportError:
+    MATPLOTLIB_AVAILABLE = False
+
+try:
+    import pandas as pd
+    PANDAS_AVAILABLE = MATPLOTLIB_AVAILABLE
 except ImportError:
     PANDAS_AVAILABLE = False
+
+try:
+    import polars as pl
+    POLARS_AVAILABLE = True
+except ImportError:
+    POLARS_AVAILABLE = False
+
+if not PANDAS_AVAILABLE and not POLARS_AVAILABLE:
     print("⚠️  pandas/matplotlib not installed - using basic analysis only")
     print("   Install with: pip install pandas matplotlib")
     print()
 
+try:
+    import ijson
+    IJSON_AVAILABLE = True
+except ImportError:
+    IJSON_AVAILABLE = False
 
-def load_data(data_dir="voice_runner_data"):
-    """Load exported data"""
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+
+def summarize(values, dtype="float64"):
+    """Return (mean, min, max) of an iterable of numbers, or None if empty"""
+    if NUMPY_AVAILABLE:
+        arr = np.fromiter(values, dtype=dtype)
+        if arr.size == 0:
+            return None
+        return arr.mean(), arr.min(), arr.max()
+
+    values = list(values)
+    if not values:
+        return None
+    return sum(values) / len(values), min(values), max(values)
+
+
+def find_export_file(data_dir="voice_runner_data"):
+    """Locate the most recent export file"""
     data_path = Path(data_dir)
 
     if not data_path.exists():
@@ -40,41 +79,96 @@ def load_data(data_dir="voice_runner_data"):
         sys.exit(1)
 
     print(f"📂 Loading data from: {export_file.name}")
+    return export_file
+
+
+def load_data(export_file):
+    """Load exported data"""
     with open(export_file) as f:
         data = json.load(f)
 
     return data
 
 
-def basic_analysis(data):
-    """Generate basic statistics without pandas"""
-    sessions = data.get('sessions', [])
-    recordings = data.get('recordings', [])
+def iter_records(export_file, key, data=None):
+    """
+    Yield each record in the export's `key` list.
+
+    Records come from `data` when the export is already loaded; otherwise
+    ijson parses the file incrementally, holding one record at a time.
+    """
+    if data is not None:
+        yield from data.get(key, [])
+    else:
+        with open(export_file, 'rb') as f:
+            yield from ijson.items(f, f'{key}.item', use_float=True)
+
+
+def basic_analysis(export_file, data=None):
+    """Generate basic statistics without pandas (streams the file when data is None)"""
+    # Single streaming pass over sessions
+    total_sessions = 0
+    players = set()
+    scores, levels, session_durations = [], [], []
+    ages, parishes, patois_first = Counter(), Counter(), Counter()
+
+    for s in iter_records(export_file, 'sessions', data):
+        total_sessions += 1
+        players.add(s.get('playerId'))
+        scores.append(s.get('finalScore', 0))
+        levels.append(s.get('maxLevelReached', 1))
+        session_durations.append(s.get('sessionDurationSeconds', 0))
+        if s.get('demographicAgeRange'):
+            ages[s.get('demographicAgeRange')] += 1
+        if s.get('demographicParish'):
+            parishes[s.get('demographicParish')] += 1
+        if s.get('demographicPatoisFirst'):
+            patois_first[s.get('demographicPatoisFirst')] += 1
+
+    # Single streaming pass over recordings
+    total_recordings = 0
+    first_timestamp = last_timestamp = None
+    categories, registers, outcomes = Counter(), Counter(), Counter()
+    onset_times, durations, amplitudes = [], [], []
+
+    for r in iter_records(export_file, 'recordings', data):
+        total_recordings += 1
+        timestamp = r.get('timestampUtc')
+        if timestamp:
+            if first_timestamp is None or timestamp < first_timestamp:
+                first_timestamp = timestamp
+            if last_timestamp is None or timestamp > last_timestamp:
+                last_timestamp = timestamp
+        categories[r.get('phraseCategory')] += 1
+        registers[r.get('phraseRegister')] += 1
+        outcomes[r.get('outcome')] += 1
+        if r.get('timeToSpeechOnsetMs'):
+            onset_times.append(r.get('timeToSpeechOnsetMs'))
+        if r.get('speechDurationMs'):
+            durations.append(r.get('speechDurationMs'))
+        if r.get('audioPeakAmplitude'):
+            amplitudes.append(r.get('audioPeakAmplitude'))
 
     print("\n" + "=" * 60)
     print("📊 COLLECTION SUMMARY")
     print("=" * 60)
 
-    print(f"\nTotal sessions: {len(sessions)}")
-    print(f"Total recordings: {len(recordings)}")
+    print(f"\nTotal sessions: {total_sessions}")
+    print(f"Total recordings: {total_recordings}")
 
-    if sessions:
-        unique_players = len(set(s.get('playerId') for s in sessions))
-        print(f"Unique players: {unique_players}")
+    if total_sessions:
+        print(f"Unique players: {len(players)}")
 
         # Time range
-        timestamps = [r.get('timestampUtc') for r in recordings if r.get('timestampUtc')]
-        if timestamps:
-            timestamps.sort()
-            print(f"Date range: {timestamps[0][:10]} to {timestamps[-1][:10]}")
+        if first_timestamp:
+            print(f"Date range: {first_timestamp[:10]} to {last_timestamp[:10]}")
 
     # Phrase categories
-    if recordings:
+    if total_recordings:
         print("\n" + "=" * 60)
         print("📝 PHRASE CATEGORIES")
         print("=" * 60)
 
-        categories = Counter(r.get('phraseCategory') for r in recordings)
         for cat, count in categories.most_common():
             print(f"  {cat}: {count} recordings")
 
@@ -83,7 +177,6 @@ def basic_analysis(data):
         print("🗣️  LANGUAGE REGISTER")
         print("=" * 60)
 
-        registers = Counter(r.get('phraseRegister') for r in recordings)
         register_names = {
             'ACR': 'Acrolect (Standard English)',
             'MES': 'Mesolect (Mid-range)',
@@ -98,102 +191,75 @@ def basic_analysis(data):
         print("⏱️  SPEECH TIMING")
         print("=" * 60)
 
-        onset_times = [r.get('timeToSpeechOnsetMs') for r in recordings if r.get('timeToSpeechOnsetMs')]
-        durations = [r.get('speechDurationMs') for r in recordings if r.get('speechDurationMs')]
-        amplitudes = [r.get('audioPeakAmplitude') for r in recordings if r.get('audioPeakAmplitude')]
+        onset_stats = summarize(onset_times, "int64")
+        duration_stats = summarize(durations, "int64")
+        amplitude_stats = summarize(amplitudes)
 
-        if onset_times:
-            print(f"  Average time to speech onset: {sum(onset_times) / len(onset_times):.0f}ms")
-            print(f"  Min onset: {min(onset_times)}ms, Max onset: {max(onset_times)}ms")
+        if onset_stats:
+            avg, lo, hi = onset_stats
+            print(f"  Average time to speech onset: {avg:.0f}ms")
+            print(f"  Min onset: {lo}ms, Max onset: {hi}ms")
 
-        if durations:
-            print(f"  Average speech duration: {sum(durations) / len(durations):.0f}ms")
-            print(f"  Min duration: {min(durations)}ms, Max duration: {max(durations)}ms")
+        if duration_stats:
+            avg, lo, hi = duration_stats
+            print(f"  Average speech duration: {avg:.0f}ms")
+            print(f"  Min duration: {lo}ms, Max duration: {hi}ms")
 
-        if amplitudes:
-            print(f"  Average peak amplitude: {sum(amplitudes) / len(amplitudes):.2f}")
+        if amplitude_stats:
+            print(f"  Average peak amplitude: {amplitude_stats[0]:.2f}")
 
         # Success rate
-        outcomes = Counter(r.get('outcome') for r in recordings)
         total_attempts = sum(outcomes.values())
         if total_attempts > 0:
             success_rate = (outcomes.get('success', 0) / total_attempts) * 100
             print(f"  Success rate: {success_rate:.1f}% ({outcomes.get('success', 0)}/{total_attempts})")
 
     # Game performance
-    if sessions:
+    if total_sessions:
         print("\n" + "=" * 60)
         print("🎮 GAME PERFORMANCE")
         print("=" * 60)
 
-        scores = [s.get('finalScore', 0) for s in sessions]
-        levels = [s.get('maxLevelReached', 1) for s in sessions]
-        durations = [s.get('sessionDurationSeconds', 0) for s in sessions]
+        score_stats = summarize(scores, "int64")
+        level_stats = summarize(levels, "int64")
+        session_duration_stats = summarize(session_durations, "int64")
 
-        if scores:
-            print(f"  Average final score: {sum(scores) / len(scores):.0f}")
-            print(f"  Highest score: {max(scores)}")
+        if score_stats:
+            print(f"  Average final score: {score_stats[0]:.0f}")
+            print(f"  Highest score: {score_stats[2]}")
 
-        if levels:
-            print(f"  Average max level: {sum(levels) / len(levels):.1f}")
-            print(f"  Highest level reached: {max(levels)}")
+        if level_stats:
+            print(f"  Average max level: {level_stats[0]:.1f}")
+            print(f"  Highest level reached: {level_stats[2]}")
 
-        if durations:
-            print(f"  Average session duration: {sum(durations) / len(durations):.0f}s")
-            print(f"  Longest session: {max(durations)}s")
+        if session_duration_stats:
+            print(f"  Average session duration: {session_duration_stats[0]:.0f}s")
+            print(f"  Longest session: {session_duration_stats[2]}s")
 
     # Demographics
-    if sessions:
+    if total_sessions:
         print("\n" + "=" * 60)
         print("👥 DEMOGRAPHICS")
         print("=" * 60)
 
-        ages = Counter(s.get('demographicAgeRange') for s in sessions if s.get('demographicAgeRange'))
         if ages:
             print("\n  Age ranges:")
             for age, count in ages.most_common():
                 print(f"    {age}: {count} players")
 
-        parishes = Counter(s.get('demographicParish') for s in sessions if s.get('demographicParish'))
         if parishes:
             print("\n  Parishes:")
             for parish, count in parishes.most_common():
                 print(f"    {parish}: {count} players")
 
-        patois_first = Counter(s.get('demographicPatoisFirst') for s in sessions if s.get('demographicPatoisFirst'))
         if patois_first:
             print("\n  Patois as first language:")
             for answer, count in patois_first.most_common():
                 print(f"    {answer}: {count} players")
 
 
-def pandas_analysis(data):
-    """Generate detailed analysis with pandas"""
-    sessions = pd.DataFrame(data.get('sessions', []))
-    recordings = pd.DataFrame(data.get('recordings', []))
-
-    output_dir = Path("analysis_output")
-    output_dir.mkdir(exist_ok=True)
-
-    print("\n" + "=" * 60)
-    print("📊 GENERATING DETAILED REPORTS")
-    print("=" * 60)
-
-    # Summary statistics
-    print("\n📈 Generating summary statistics...")
-    summary = {
-        'Total Sessions': len(sessions),
-        'Total Recordings': len(recordings),
-        'Unique Players': sessions['playerId'].nunique() if not sessions.empty else 0,
-        'Date Range': f"{recordings['timestampUtc'].min()} to {recordings['timestampUtc'].max()}" if not recordings.empty else "N/A",
-    }
-
-    summary_file = output_dir / "summary.json"
-    with open(summary_file, 'w') as f:
-        json.dump(summary, f, indent=2)
-    print(f"   ✓ Saved to {summary_file}")
-
-    # Detailed CSV exports
+def pandas_csv_exports(sessions, recordings, output_dir):
+    """Write session/recording CSVs and per-category/register stats with pandas"""
     if not sessions.empty:
         print("\n📄 Exporting CSVs...")
         sessions.to_csv(output_dir / "sessions.csv", index=False)
@@ -222,6 +288,167 @@ def pandas_analysis(data):
         register_stats.to_csv(output_dir / "register_stats.csv")
         print(f"   ✓ register_stats.csv")
 
+
+def pandas_compatible(df):
+    """Format list and bool columns the way pandas writes them to CSV"""
+    return df.with_columns(
+        [
+            pl.col(name).map_elements(lambda v: str(v.to_list()), return_dtype=pl.Utf8)
+            for name, dtype in df.schema.items() if isinstance(dtype, pl.List)
+        ] + [
+            pl.col(name).replace_strict({True: "True", False: "False"}, return_dtype=pl.Utf8)
+            for name, dtype in df.schema.items() if dtype == pl.Boolean
+        ]
+    )
+
+
+def polars_csv_exports(sessions, recordings, output_dir):
+    """Write session/recording CSVs and per-category/register stats with polars"""
+    if not sessions.is_empty():
+        print("\n📄 Exporting CSVs...")
+        pandas_compatible(sessions).write_csv(output_dir / "sessions.csv")
+        print("   ✓ sessions.csv")
+
+    if not recordings.is_empty():
+        pandas_compatible(recordings).write_csv(output_dir / "recordings.csv")
+        print("   ✓ recordings.csv")
+
+        # Recording statistics by category
+        category_stats = (
+            recordings.lazy()
+            .group_by('phraseCategory')
+            .agg([
+                pl.col('phraseId').count(),
+                pl.col('timeToSpeechOnsetMs').mean().round(2),
+                pl.col('speechDurationMs').mean().round(2),
+                pl.col('audioPeakAmplitude').mean().round(2),
+            ])
+            .sort('phraseCategory')
+            .collect()
+        )
+        category_stats.write_csv(output_dir / "category_stats.csv")
+        print("   ✓ category_stats.csv")
+
+        # Register statistics
+        register_stats = (
+            recordings.lazy()
+            .group_by('phraseRegister')
+            .agg([
+                pl.col('phraseId').count(),
+                pl.col('timeToSpeechOnsetMs').mean().round(2),
+                pl.col('speechDurationMs').mean().round(2),
+            ])
+            .sort('phraseRegister')
+            .collect()
+        )
+        register_stats.write_csv(output_dir / "register_stats.csv")
+        print("   ✓ register_stats.csv")
+
+
+def polars_frame(rows):
+    """Build a DataFrame from export records (polars cannot infer a schema from no rows)"""
+    return pl.from_dicts(rows, infer_schema_length=None) if rows else pl.DataFrame()
+
+
+def polars_analysis(data):
+    """Generate detailed analysis with polars (plots need matplotlib, not pandas)"""
+    sessions = polars_frame(data.get('sessions', []))
+    recordings = polars_frame(data.get('recordings', []))
+
+    output_dir = Path("analysis_output")
+    output_dir.mkdir(exist_ok=True)
+
+    print("\n" + "=" * 60)
+    print("📊 GENERATING DETAILED REPORTS")
+    print("=" * 60)
+
+    # Summary statistics
+    print("\n📈 Generating summary statistics...")
+    summary = {
+        'Total Sessions': sessions.height,
+        'Total Recordings': recordings.height,
+        'Unique Players': sessions['playerId'].drop_nulls().n_unique() if not sessions.is_empty() else 0,
+        'Date Range': f"{recordings['timestampUtc'].min()} to {recordings['timestampUtc'].max()}" if not recordings.is_empty() else "N/A",
+    }
+
+    summary_file = output_dir / "summary.json"
+    with open(summary_file, 'w') as f:
+        json.dump(summary, f, indent=2)
+    print(f"   ✓ Saved to {summary_file}")
+
+    # Detailed CSV exports
+    polars_csv_exports(sessions, recordings, output_dir)
+
+    # Generate plots
+    if MATPLOTLIB_AVAILABLE and not recordings.is_empty():
+        print("\n📊 Generating visualizations...")
+
+        fig, axes = plt.subplots(2, 2, figsize=(12, 10))
+        fig.suptitle('Voice Runner Data Analysis', fontsize=16)
+
+        # Plot 1: Phrase categories
+        counts = recordings['phraseCategory'].value_counts(sort=True)
+        axes[0, 0].bar(counts['phraseCategory'].cast(pl.Utf8).to_list(), counts['count'].to_list())
+        axes[0, 0].set_title('Recordings by Phrase Category')
+        axes[0, 0].set_xlabel('Category')
+        axes[0, 0].set_ylabel('Count')
+
+        # Plot 2: Language register
+        counts = recordings['phraseRegister'].value_counts(sort=True)
+        axes[0, 1].bar(counts['phraseRegister'].cast(pl.Utf8).to_list(), counts['count'].to_list())
+        axes[0, 1].set_title('Recordings by Language Register')
+        axes[0, 1].set_xlabel('Register')
+        axes[0, 1].set_ylabel('Count')
+
+        # Plot 3: Speech onset time distribution
+        axes[1, 0].hist(recordings['timeToSpeechOnsetMs'].drop_nulls().to_list(), bins=30)
+        axes[1, 0].set_title('Time to Speech Onset Distribution')
+        axes[1, 0].set_xlabel('Time (ms)')
+        axes[1, 0].set_ylabel('Frequency')
+
+        # Plot 4: Speech duration distribution
+        axes[1, 1].hist(recordings['speechDurationMs'].drop_nulls().to_list(), bins=30)
+        axes[1, 1].set_title('Speech Duration Distribution')
+        axes[1, 1].set_xlabel('Duration (ms)')
+        axes[1, 1].set_ylabel('Frequency')
+
+        plt.tight_layout()
+        plot_file = output_dir / "analysis_plots.png"
+        plt.savefig(plot_file, dpi=150)
+        print(f"   ✓ {plot_file}")
+
+    print(f"\n✅ Analysis complete! Reports saved to: {output_dir.absolute()}")
+
+
+def pandas_analysis(data):
+    """Generate detailed analysis with pandas"""
+    sessions = pd.DataFrame(data.get('sessions', []))
+    recordings = pd.DataFrame(data.get('recordings', []))
+
+    output_dir = Path("analysis_output")
+    output_dir.mkdir(exist_ok=True)
+
+    print("\n" + "=" * 60)
+    print("📊 GENERATING DETAILED REPORTS")
+    print("=" * 60)
+
+    # Summary statistics
+    print("\n📈 Generating summary statistics...")
+    summary = {
+        'Total Sessions': len(sessions),
+        'Total Recordings': len(recordings),
+        'Unique Players': sessions['playerId'].nunique() if not sessions.empty else 0,
+        'Date Range': f"{recordings['timestampUtc'].min()} to {recordings['timestampUtc'].max()}" if not recordings.empty else "N/A",
+    }
+
+    summary_file = output_dir / "summary.json"
+    with open(summary_file, 'w') as f:
+        json.dump(summary, f, indent=2)
+    print(f"   ✓ Saved to {summary_file}")
+
+    # Detailed CSV exports
+    pandas_csv_exports(sessions, recordings, output_dir)
+
     # Generate plots
     print("\n📊 Generating visualizations...")
 
@@ -267,15 +494,23 @@ def main():
     print("🎮 Voice Runner Data Analysis")
     print("=" * 60)
 
-    data = load_data(data_dir)
+    export_file = find_export_file(data_dir)
+
+    # The detailed report needs the whole export in memory, so parse it once
+    # here and share it; stream with ijson only when basic analysis runs alone
+    detailed = POLARS_AVAILABLE or PANDAS_AVAILABLE
+    data = load_data(export_file) if detailed or not IJSON_AVAILABLE else None
 
-    # Always run basic analysis
-    basic_analysis(data)
+    # Always run basic analysis (streams the export when ijson is installed)
+    basic_analysis(export_file, data)
 
-    # Run pandas analysis if available
-    if PANDAS_AVAILABLE:
+    # Run detailed analysis if available (polars preferred, pandas otherwise)
+    if detailed:
         try:
-            pandas_analysis(data)
+            if POLARS_AVAILABLE:
+                polars_analysis(data)
+            else:
+                pandas_analysis(data)
         except Exception as e:
             print(f"\n⚠️  Error in detailed analysis: {e}")
     else:
@@ -1,42 +1,132 @@
 #!/usr/bin/env python3
 """
 Download all Voice Runner data from Railway backend
-Usage: python scripts/download_data.py [output_directory]
+Usage: python scripts/download_data.py [backend_url] [output_directory] [--archive]
 """
 
 import sys
 import json
+import shutil
+import asyncio
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from pathlib import Path
 from datetime import datetime
 
-API_URL = "https://voice-runner-production.up.railway.app/api"
+BACKEND_URL = "https://voice-runner-production.up.railway.app"
+CHUNK_SIZE = 1024 * 1024
+RETRY_TOTAL = 5
+RETRY_BACKOFF = 0.3
+RETRY_STATUSES = {500, 502, 503, 504}
+
+
+def create_session():
+    """Create an HTTP session that reuses connections and retries server errors"""
+    session = requests.Session()
+    retry = Retry(total=RETRY_TOTAL, backoff_factor=RETRY_BACKOFF, status_forcelist=sorted(RETRY_STATUSES))
+    adapter = HTTPAdapter(max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def download_single(session, url, archive_path):
+    """Download the archive as one streaming request"""
+    response = session.get(url, stream=True)
+    response.raise_for_status()
+
+    # Copy straight from the raw socket stream in 1 MiB blocks
+    response.raw.decode_content = True
+    with open(archive_path, 'wb') as f:
+        shutil.copyfileobj(response.raw, f, length=CHUNK_SIZE)
+
+
+async def fetch_json(client, path):
+    """GET an API path and return its decoded JSON body, retrying server errors"""
+    for attempt in range(RETRY_TOTAL + 1):
+        try:
+            response = await client.get(path)
+        except httpx.TransportError:
+            if attempt == RETRY_TOTAL:
+                raise
+        else:
+            if response.status_code not in RETRY_STATUSES or attempt == RETRY_TOTAL:
+                response.raise_for_status()
+                return response.json()
+
+        # Same exponential backoff as the requests session's Retry
+        await asyncio.sleep(RETRY_BACKOFF * (2 ** attempt))
+
+
+async def fetch_metadata(api_url):
+    """Check the backend is up, then fetch stats and the full export concurrently"""
+    async with httpx.AsyncClient(base_url=api_url, http2=True, timeout=60) as client:
+        await fetch_json(client, "/health")
+        return await asyncio.gather(fetch_json(client, "/stats"), fetch_json(client, "/export"))
+
+
+def download_metadata(api_url, output_dir):
+    """Download stats and the full metadata export"""
+    print("📊 Downloading statistics and full data export...")
+    stats, export_data = asyncio.run(fetch_metadata(api_url))
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    files = {
+        "stats.json": stats,
+        f"full_export_{timestamp}.json": export_data,
+        "sessions.json": export_data["sessions"],
+        "recordings.json": export_data["recordings"],
+    }
+    for name, content in files.items():
+        with open(output_dir / name, "w") as f:
+            json.dump(content, f, indent=2)
+
+    print(f"   Total sessions: {stats['totalSessions']}")
+    print(f"   Total recordings: {stats['totalRecordings']}")
+    print()
+    print(f"✅ Downloaded {len(export_data['sessions'])} sessions")
+    print(f"✅ Downloaded {len(export_data['recordings'])} recording metadata entries")
+    print(f"📁 Data saved to: {output_dir.absolute()}")
+
+
+def download_archive(api_url, output_dir):
+    """Download the complete data archive (metadata and audio) as tar.gz"""
+    print("📦 Downloading complete archive...")
+    url = f"{api_url}/download/archive"
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    archive_path = output_dir / f"voice-runner-data_{timestamp}.tar.gz"
+    session = create_session()
+
+    # The archive is generated per request, so stream it in one go
+    download_single(session, url, archive_path)
+
+    print(f"✅ Complete archive downloaded to: {archive_path}")
+    print()
+    print("To extract:")
+    print(f"  tar -xzf {archive_path}")
+
 
 def main():
-    output_dir = Path(sys.argv[1] if len(sys.argv) > 1 else "./voice-runner-data")
+    args = [arg for arg in sys.argv[1:] if arg != "--archive"]
+    include_archive = "--archive" in sys.argv[1:]
+
+    backend_url = args.pop(0) if args and args[0].startswith("http") else BACKEND_URL
+    api_url = f"{backend_url.rstrip('/')}/api"
+    output_dir = Path(args[0] if args else "./voice_runner_data")
     output_dir.mkdir(parents=True, exist_ok=True)
 
     print("🐦 Voice Runner Data Downloader")
     print("=" * 40)
     print()
 
-    # Download complete archive (easiest method)
-    print("📦 Downloading complete archive...")
     try:
-        response = requests.get(f"{API_URL}/download/archive", stream=True)
-        response.raise_for_status()
-
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        archive_path = output_dir / f"voice-runner-data_{timestamp}.tar.gz"
-
-        with open(archive_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
+        download_metadata(api_url, output_dir)
 
-        print(f"✅ Complete archive downloaded to: {archive_path}")
-        print()
-        print("To extract:")
-        print(f"  tar -xzf {archive_path}")
+        if include_archive:
+            print()
+            download_archive(api_url, output_dir)
 
     except Exception as e:
         print(f"❌ Error: {e}")